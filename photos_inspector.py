@@ -1,14 +1,34 @@
+import json
 import os
 import shutil
 import threading
 import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 import torch
 import numpy as np
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
 from transformers import AutoModel, AutoImageProcessor
 from transformers.image_utils import load_image
 from flask import Flask, request, send_from_directory, render_template_string, jsonify
 from urllib.parse import unquote
 
+try:
+    import simsimd  # optional: SIMD-accelerated similarity on CPU
+except ImportError:
+    simsimd = None
+
+try:
+    import faiss  # optional: nearest-neighbor search for large galleries
+except ImportError:
+    faiss = None
+
+try:
+    from numba import njit, prange  # optional: JIT-compiled union-find
+except ImportError:
+    njit = None
+
 # ---------------------------
 # Global Variables and Config
 # ---------------------------
@@ -19,12 +39,63 @@ MODEL_OPTIONS = {
 processing = False
 total_images = 0
 processed_images = 0
-embeddings = {}  # filepath -> embedding vector
 BASE_FOLDER = None  # will be set from user input
 start_time = None  # time when processing started
 model = None
 processor = None
 EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')  # default extensions
+BATCH_SIZE = 32  # images per model forward pass
+MODEL_ID = None  # hub id of the currently loaded model
+EMBEDDINGS_FILE = "embeddings.npy"  # cached matrix, stored under BASE_FOLDER
+MANIFEST_FILE = "files.json"  # paths + (mtime, size) signatures for the cache
+THUMB_DIR_NAME = ".thumbnails"  # sidecar thumbnail cache under BASE_FOLDER
+THUMB_SIZE = (512, 256)  # max thumbnail dimensions for the 200px UI tiles
+THUMB_QUALITY = 80
+
+# ---------------------------
+# Shared State
+# ---------------------------
+class RWLock:
+    # Minimal reader-writer lock: any number of concurrent readers, one
+    # writer, so threshold queries never block each other.
+    def __init__(self):
+        self._readers = 0
+        self._mutex = threading.Lock()
+        self._writer = threading.Lock()
+
+    @contextmanager
+    def rlock(self):
+        with self._mutex:
+            self._readers += 1
+            if self._readers == 1:
+                self._writer.acquire()
+        try:
+            yield
+        finally:
+            with self._mutex:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._writer.release()
+
+    @contextmanager
+    def wlock(self):
+        with self._writer:
+            yield
+
+@dataclass
+class AppState:
+    files: list = field(default_factory=list)  # image paths, parallel to the rows of E
+    E: np.ndarray = None  # (n, d) float16 matrix of L2-normalized embeddings
+    version: int = 0  # bumped whenever a processing run completes
+
+state = AppState()
+state_lock = RWLock()
+
+def snapshot_state():
+    # Routes read (files, E, version) as one consistent unit; the worker
+    # only publishes fully built replacements under the write lock.
+    with state_lock.rlock():
+        return state.files, state.E, state.version
 
 # ---------------------------
 # Helper: Case-insensitive file search
@@ -38,67 +109,460 @@ def find_file_case_insensitive(directory, filename):
 # ---------------------------
 # Helper Function: Process Images in Background
 # ---------------------------
+def iter_image_files(path, extensions):
+    # os.scandir reuses the file-type info from the directory read, so no
+    # extra stat call per entry, and the extension set gives O(1) matching.
+    try:
+        entries = os.scandir(path)
+    except OSError as e:
+        print(f"Cannot list {path}: {e}")
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name == THUMB_DIR_NAME:
+                    continue
+                yield from iter_image_files(entry.path, extensions)
+            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                yield entry.path
+
+def make_thumbnail(file, base_folder):
+    rel_path = os.path.relpath(file, base_folder)
+    thumb = os.path.join(base_folder, THUMB_DIR_NAME, rel_path + ".jpg")
+    if os.path.exists(thumb):
+        return
+    try:
+        with Image.open(file) as im:
+            # draft lets the JPEG decoder stop at a reduced scale instead
+            # of decoding the full-resolution image first.
+            im.draft("RGB", THUMB_SIZE)
+            im = im.convert("RGB")
+            im.thumbnail(THUMB_SIZE)
+            os.makedirs(os.path.dirname(thumb), exist_ok=True)
+            im.save(thumb, "jpeg", quality=THUMB_QUALITY)
+    except Exception as e:
+        print(f"Could not create thumbnail for {file}: {e}")
+
+class ImageDataset(Dataset):
+    # Decodes and preprocesses images on DataLoader worker processes so the
+    # GPU doesn't idle during JPEG decode/resize on the main thread. The
+    # processor travels with the dataset because spawned workers (the
+    # default start method on macOS) re-import the module and would see
+    # the processor global as None.
+    def __init__(self, files, base_folder, processor):
+        self.files = files
+        self.base_folder = base_folder
+        self.processor = processor
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, idx):
+        file = self.files[idx]
+        try:
+            image = load_image(file)
+            pixel_values = self.processor(images=[image], return_tensors="pt")["pixel_values"][0]
+            make_thumbnail(file, self.base_folder)
+            return file, pixel_values
+        except Exception as e:
+            print(f"Error loading {file}: {e}")
+            return file, None
+
+def collate_batch(items):
+    files = [f for f, pv in items if pv is not None]
+    tensors = [pv for _, pv in items if pv is not None]
+    pixel_values = torch.stack(tensors) if tensors else None
+    return files, pixel_values
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+def load_cached_embeddings():
+    # Returns ({path: (row, mtime, size)}, mmap'd matrix) for the saved run,
+    # or ({}, None) when there is no usable cache for this model.
+    emb_path = os.path.join(BASE_FOLDER, EMBEDDINGS_FILE)
+    manifest_path = os.path.join(BASE_FOLDER, MANIFEST_FILE)
+    if not (os.path.exists(emb_path) and os.path.exists(manifest_path)):
+        return {}, None
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("model") != MODEL_ID:
+            return {}, None
+        cached = np.load(emb_path, mmap_mode="r")
+        entries = manifest.get("files", [])
+        if len(entries) != len(cached):
+            return {}, None
+        index = {path: (row, mtime, size) for row, (path, mtime, size) in enumerate(entries)}
+        return index, cached
+    except Exception as e:
+        print(f"Could not load cached embeddings: {e}")
+        return {}, None
+
+def save_embeddings(paths, matrix):
+    try:
+        np.save(os.path.join(BASE_FOLDER, EMBEDDINGS_FILE), matrix)
+        manifest = {"model": MODEL_ID, "files": [[f] + file_signature(f) for f in paths]}
+        with open(os.path.join(BASE_FOLDER, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+        print(f"Saved {len(paths)} embeddings to {BASE_FOLDER}")
+    except Exception as e:
+        print(f"Could not save embeddings: {e}")
+
+def embed_batch(files):
+    images = [load_image(f) for f in files]
+    inputs = processor(images=images, return_tensors="pt")
+    pixel_values = inputs["pixel_values"].to(model.device, model.dtype)
+    with torch.inference_mode():
+        emb = model.get_image_features(pixel_values=pixel_values)
+    # Normalize in fp32: the half-precision output is fine for the dot
+    # products but the norm itself is more stable in full precision.
+    emb = torch.nn.functional.normalize(emb.float(), dim=1)
+    return emb.cpu().numpy()
+
 def process_images():
-    global processing, total_images, processed_images, embeddings, BASE_FOLDER, start_time, EXTENSIONS
-    image_files = []
-    for root, dirs, files in os.walk(BASE_FOLDER):
-        for file in files:
-            if file.lower().endswith(EXTENSIONS):
-                image_files.append(os.path.join(root, file))
+    # Whatever happens inside the run, processing must come back down or
+    # the UI polls /progress forever.
+    global processing
+    try:
+        _process_images()
+    finally:
+        processing = False
+
+def _process_images():
+    global total_images, processed_images, BASE_FOLDER, start_time, EXTENSIONS
+    image_files = list(iter_image_files(BASE_FOLDER, frozenset(EXTENSIONS)))
     total_images = len(image_files)
     processed_images = 0
-    embeddings = {}
+    # Start the clock before the cache-reuse loop below: it already bumps
+    # processed_images, and /progress divides elapsed time by that count.
+    start_time = time.time()
+    # SoA layout: one contiguous matrix plus a parallel path list, so the
+    # clustering path streams rows instead of chasing per-file arrays.
+    new_files = []
+    matrix = None
+    next_row = 0
     print(f"Found {total_images} images to process.")
-    start_time = time.time()  # record start time
+    # Reuse embeddings persisted by a previous run: anything whose
+    # (mtime, size) signature still matches is copied over, and only the
+    # delta goes through the model.
+    cached_index, cached_matrix = load_cached_embeddings()
+    to_embed = []
     for file in image_files:
+        entry = cached_index.get(file)
+        if entry is not None:
+            row, mtime, size = entry
+            try:
+                if file_signature(file) == [mtime, size]:
+                    if matrix is None:
+                        matrix = np.empty((total_images, cached_matrix.shape[1]), dtype=np.float16)
+                    matrix[next_row] = cached_matrix[row]
+                    new_files.append(file)
+                    next_row += 1
+                    processed_images += 1
+                    continue
+            except OSError:
+                pass
+        to_embed.append(file)
+    if cached_index:
+        print(f"Reused {processed_images} cached embeddings, {len(to_embed)} left to compute.")
+    if to_embed:
+        # Warm up the compiled model at the production batch size so Inductor
+        # finishes codegen before the first real batch instead of during it.
+        # The output width also tells us d for the preallocation below.
         try:
-            image = load_image(file)
-            inputs = processor(images=[image], return_tensors="pt").to(model.device)
-            with torch.no_grad():
-                emb = model.get_image_features(**inputs)
-            emb = emb.cpu().numpy()[0]
-            emb = emb / np.linalg.norm(emb)
-            embeddings[file] = emb
-            processed_images += 1
-            print(f"Processed: {file} ({processed_images}/{total_images})")
+            size = getattr(processor, "size", None) or {}
+            side = size.get("height", 512)
+            dummy = torch.zeros((BATCH_SIZE, 3, side, side), dtype=model.dtype, device=model.device)
+            with torch.inference_mode():
+                out = model.get_image_features(pixel_values=dummy)
+            if matrix is None:
+                matrix = np.empty((total_images, out.shape[-1]), dtype=np.float16)
         except Exception as e:
-            print(f"Error processing {file}: {e}")
-    processing = False
+            print(f"Warm-up forward failed: {e}")
+    loader = DataLoader(
+        ImageDataset(to_embed, BASE_FOLDER, processor),
+        batch_size=BATCH_SIZE,
+        num_workers=os.cpu_count(),
+        pin_memory=True,
+        persistent_workers=True,
+        prefetch_factor=4,
+        collate_fn=collate_batch,
+    ) if to_embed else []
+    host_buf = None  # pinned staging buffer for async device-to-host copies
+    for batch, pixel_values in loader:
+        if pixel_values is None:
+            continue
+        try:
+            with torch.inference_mode():
+                emb = model.get_image_features(pixel_values=pixel_values.to(model.device, model.dtype, non_blocking=True))
+                emb = torch.nn.functional.normalize(emb.float(), dim=1)
+            if emb.device.type == "cuda":
+                # Copy into pinned memory without forcing an implicit sync,
+                # so the transfer overlaps the tail of the forward pass and
+                # the stream is synchronized once per batch.
+                if host_buf is None or host_buf.shape[1] != emb.shape[1]:
+                    host_buf = torch.empty((BATCH_SIZE, emb.shape[1]), pin_memory=True)
+                staged = host_buf[:emb.shape[0]]
+                staged.copy_(emb, non_blocking=True)
+                torch.cuda.current_stream().synchronize()
+                embs = staged.numpy()
+            else:
+                embs = emb.cpu().numpy()
+            if matrix is None:
+                matrix = np.empty((total_images, embs.shape[1]), dtype=np.float16)
+            matrix[next_row:next_row + len(batch)] = embs
+            new_files.extend(batch)
+            next_row += len(batch)
+            processed_images += len(batch)
+            print(f"Processed batch of {len(batch)} ({processed_images}/{total_images})")
+        except Exception as e:
+            # Retry the failing batch one image at a time so a single bad
+            # file doesn't take down its whole batch.
+            print(f"Error processing batch: {e}")
+            for file in batch:
+                try:
+                    emb = embed_batch([file])[0]
+                    if matrix is None:
+                        matrix = np.empty((total_images, emb.shape[0]), dtype=np.float16)
+                    matrix[next_row] = emb
+                    new_files.append(file)
+                    next_row += 1
+                    processed_images += 1
+                    print(f"Processed: {file} ({processed_images}/{total_images})")
+                except Exception as e:
+                    print(f"Error processing {file}: {e}")
+    # The run is fully assembled in locals; publish it as one atomic swap
+    # so no route ever sees a files list and a matrix from different runs.
+    final_matrix = matrix[:next_row] if matrix is not None else None
+    with state_lock.wlock():
+        state.files = new_files
+        state.E = final_matrix
+        state.version += 1
+    if final_matrix is not None:
+        save_embeddings(new_files, final_matrix)
 
 # ---------------------------
 # Clustering Function
 # ---------------------------
-def compute_clusters(threshold: float):
-    files = list(embeddings.keys())
-    n = len(files)
-    parent = list(range(n))
-    def find(i):
+_device_E = None  # (version, fp16 copy of E on the model device)
+_quantized_E = None  # (version, int8 copy of E for SIMD dot products)
+_dsu_state = None  # (version, threshold, edge count, parent) of the last query
+_cluster_cache = {}  # (threshold, embeddings version) -> clusters list
+
+ANN_NEIGHBORS = 32  # top-k candidates per image when searching with FAISS
+EDGE_MIN_SIM = 0.5  # matches the slider minimum; edges below this are never needed
+SIM_BLOCK = 1024  # rows per similarity strip; bounds peak memory at O(SIM_BLOCK * n)
+
+def similar_pairs(E, threshold, version):
+    # Returns ((m, 2) index pairs with i < j, their similarities). The
+    # version keys the derived device/int8 copies of E, so a query racing
+    # a reprocess can never pair fresh embeddings with stale caches.
+    global _device_E, _quantized_E
+    if faiss is not None:
+        # Near-duplicates have few neighbors, so a top-k search over an
+        # inner-product index replaces the O(n^2) pair enumeration with
+        # O(n*k) while keeping memory at O(n*k).
+        Ef = np.ascontiguousarray(E, dtype=np.float32)  # FAISS wants float32
+        index = faiss.IndexFlatIP(Ef.shape[1])
+        index.add(Ef)
+        k = min(ANN_NEIGHBORS, len(Ef))
+        D, I = index.search(Ef, k)
+        rows = np.repeat(np.arange(len(E)), k)
+        cols = I.ravel()
+        sims = D.ravel()
+        mask = (cols > rows) & (sims >= threshold)
+        return np.stack([rows[mask], cols[mask]], axis=1), sims[mask].astype(np.float32)
+    # Dense fallback, tiled into SIM_BLOCK x n strips: each strip is
+    # thresholded and discarded immediately, so peak memory stays at
+    # O(SIM_BLOCK * n) instead of the full n^2 matrix. The triu offset
+    # b + 1 keeps only columns past the strip's global row index.
+    n = len(E)
+    pairs_out = []
+    sims_out = []
+    if model is not None and model.device.type != "cpu":
+        # Run the GEMM in fp16 on the device the model already occupies.
+        # Read the cache global once: another request holding a different
+        # version may swap it between a check and a later use.
+        cache = _device_E
+        if cache is None or cache[0] != version:
+            cache = (version, torch.from_numpy(E).to(model.device, dtype=torch.float16))
+            _device_E = cache
+        device_E = cache[1]
+        for b in range(0, n, SIM_BLOCK):
+            S = device_E[b:b + SIM_BLOCK] @ device_E.T
+            mask = torch.triu(S >= threshold, diagonal=b + 1)
+            idx = torch.nonzero(mask)
+            idx[:, 0] += b
+            pairs_out.append(idx.cpu().numpy())
+            sims_out.append(S[mask].float().cpu().numpy())
+        return np.concatenate(pairs_out), np.concatenate(sims_out)
+    if simsimd is not None:
+        # SQ8 quantization: int8 dot products accumulate in int32 via
+        # VNNI/DOTPROD where available, and dividing by 127^2 recovers the
+        # cosine with error well below the threshold granularity.
+        cache = _quantized_E
+        if cache is None or cache[0] != version:
+            cache = (version, np.clip(np.round(E * 127.0), -127, 127).astype(np.int8))
+            _quantized_E = cache
+        quantized_E = cache[1]
+    else:
+        # BLAS has no fp16 GEMM; upcast once (O(n*d)) rather than per strip.
+        E32 = E.astype(np.float32)
+    for b in range(0, n, SIM_BLOCK):
+        if simsimd is not None:
+            S = np.asarray(simsimd.cdist(quantized_E[b:b + SIM_BLOCK], quantized_E, metric="dot"), dtype=np.float32) / (127.0 * 127.0)
+        else:
+            S = E32[b:b + SIM_BLOCK] @ E32.T
+        i_idx, j_idx = np.where(np.triu(S, k=b + 1) >= threshold)
+        pairs_out.append(np.stack([i_idx + b, j_idx], axis=1))
+        sims_out.append(S[i_idx, j_idx].astype(np.float32))
+    return np.concatenate(pairs_out), np.concatenate(sims_out)
+
+_edge_cache = None  # (version, sims sorted desc, pairs in the same order)
+
+def get_sorted_edges(matrix, version):
+    # All edges that any slider position can ever need, computed once per
+    # embeddings version and sorted by similarity descending, so a
+    # threshold query reduces to taking a prefix.
+    global _edge_cache
+    cache = _edge_cache  # single read; concurrent requests may replace it
+    if cache is not None and cache[0] == version:
+        return cache[1], cache[2]
+    if len(matrix) > 1:
+        pairs, sims = similar_pairs(matrix, EDGE_MIN_SIM, version)
+        order = np.argsort(-sims)
+        sims = sims[order]
+        pairs = np.ascontiguousarray(pairs[order])
+    else:
+        sims = np.empty(0, dtype=np.float32)
+        pairs = np.empty((0, 2), dtype=np.int64)
+    _edge_cache = (version, sims, pairs)
+    return sims, pairs
+
+def _process_pairs(pairs, parent):
+    # Union-find over an (m, 2) pair array with path-halving, operating on
+    # a flat int32 parent array instead of Python ints.
+    for k in range(len(pairs)):
+        i = pairs[k, 0]
+        j = pairs[k, 1]
         while parent[i] != i:
             parent[i] = parent[parent[i]]
             i = parent[i]
-        return i
-    def union(i, j):
-        ri, rj = find(i), find(j)
-        if ri != rj:
-            parent[rj] = ri
-    for i in range(n):
-        for j in range(i + 1, n):
-            sim = np.dot(embeddings[files[i]], embeddings[files[j]])
-            if sim >= threshold:
-                union(i, j)
+        while parent[j] != j:
+            parent[j] = parent[parent[j]]
+            j = parent[j]
+        if i != j:
+            parent[j] = i
+
+process_pairs = njit(cache=True)(_process_pairs) if njit is not None else _process_pairs
+
+PARALLEL_PAIRS_MIN = 1 << 16  # below this the sequential loop wins
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def process_pairs_parallel(pairs, parent, num_chunks):
+        # Sample-and-link: each thread builds a union-find forest over its
+        # slab of the pair array, then the local forests are merged into
+        # the shared parent array by unioning every (v, local root) link.
+        n = parent.shape[0]
+        m = len(pairs)
+        local = np.empty((num_chunks, n), dtype=np.int32)
+        chunk = (m + num_chunks - 1) // num_chunks
+        for t in prange(num_chunks):
+            lp = local[t]
+            for v in range(n):
+                lp[v] = v
+            end = min((t + 1) * chunk, m)
+            for k in range(t * chunk, end):
+                i = pairs[k, 0]
+                j = pairs[k, 1]
+                while lp[i] != i:
+                    lp[i] = lp[lp[i]]
+                    i = lp[i]
+                while lp[j] != j:
+                    lp[j] = lp[lp[j]]
+                    j = lp[j]
+                if i != j:
+                    lp[j] = i
+        for t in range(num_chunks):
+            lp = local[t]
+            for v in range(n):
+                r = v
+                while lp[r] != r:
+                    r = lp[r]
+                i = v
+                j = r
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                while parent[j] != j:
+                    parent[j] = parent[parent[j]]
+                    j = parent[j]
+                if i != j:
+                    parent[j] = i
+else:
+    process_pairs_parallel = None
+
+def compute_clusters(threshold: float, snapshot=None):
+    # Both /clusters and /unclustered hit this on every slider move, so the
+    # result is memoized until the embeddings change. Callers that already
+    # hold a snapshot pass it in so one request never mixes two versions.
+    # Edges below EDGE_MIN_SIM are never computed, so lower thresholds
+    # from hand-edited query strings clamp to the supported range instead
+    # of silently returning (and caching) incomplete clusters.
+    threshold = max(threshold, EDGE_MIN_SIM)
+    paths, matrix, version = snapshot if snapshot is not None else snapshot_state()
+    cache_key = (threshold, version)
+    cached = _cluster_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    global _dsu_state
+    n = len(paths)
+    parent = np.arange(n, dtype=np.int32)
+    start_k = 0
+    dsu = _dsu_state  # single read; concurrent requests may replace it
+    if dsu is not None and dsu[0] == version and threshold <= dsu[1]:
+        # Moving the slider down only adds edges, so continue from the
+        # union-find state of the previous (higher) threshold.
+        parent = dsu[3].copy()
+        start_k = dsu[2]
+    if n > 1:
+        sims, pairs = get_sorted_edges(matrix, version)
+        # Edges are sorted by similarity descending, so the edges at or
+        # above the threshold form the prefix of length k.
+        k = int(np.searchsorted(-sims, -threshold, side="right"))
+        if k > start_k:
+            batch = np.ascontiguousarray(pairs[start_k:k])
+            if process_pairs_parallel is not None and len(batch) >= PARALLEL_PAIRS_MIN:
+                process_pairs_parallel(batch, parent, os.cpu_count())
+            else:
+                process_pairs(batch, parent)
+        _dsu_state = (version, threshold, max(k, start_k), parent)
+    # Flatten every chain to its root with vectorized path compression.
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            break
+        parent = grand
     clusters_map = {}
-    for i, file in enumerate(files):
-        root = find(i)
-        clusters_map.setdefault(root, []).append(file)
+    for i, file in enumerate(paths):
+        clusters_map.setdefault(int(parent[i]), []).append(file)
     clusters = [cluster for cluster in clusters_map.values() if len(cluster) > 1]
-    return sorted(clusters, key=lambda cluster: len(cluster))
+    clusters = sorted(clusters, key=lambda cluster: len(cluster))
+    _cluster_cache[cache_key] = clusters
+    return clusters
 
 # ---------------------------
 # Unclustered Images Function
 # ---------------------------
 def compute_unclustered(threshold: float):
-    all_files = set(embeddings.keys())
-    clusters = compute_clusters(threshold)
+    # One snapshot for both the file list and the clustering, so a publish
+    # landing mid-request cannot pair old files with new clusters.
+    snapshot = snapshot_state()
+    all_files = set(snapshot[0])
+    clusters = compute_clusters(threshold, snapshot)
     clustered_files = set()
     for cluster in clusters:
         clustered_files.update(cluster)
@@ -114,18 +578,52 @@ app = Flask(__name__)
 @app.route("/image/<path:filename>")
 def serve_image(filename):
     safe_filename = unquote(filename)
-    return send_from_directory(BASE_FOLDER, safe_filename)
+    # conditional=True enables ETag/If-Modified-Since handling (and the
+    # wsgi.file_wrapper sendfile path); the cache headers let the browser
+    # reuse images across slider moves instead of re-fetching them.
+    response = send_from_directory(BASE_FOLDER, safe_filename, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+@app.route("/thumb/<path:filename>")
+def serve_thumb(filename):
+    safe_filename = unquote(filename)
+    thumb_dir = os.path.join(BASE_FOLDER, THUMB_DIR_NAME)
+    thumb_name = safe_filename + ".jpg"
+    if os.path.exists(os.path.join(thumb_dir, thumb_name)):
+        response = send_from_directory(thumb_dir, thumb_name, conditional=True)
+    else:
+        # No thumbnail yet (e.g. the embeddings were reused from disk):
+        # fall back to the original image.
+        response = send_from_directory(BASE_FOLDER, safe_filename, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
 
 @app.route("/start", methods=["POST"])
 def start():
-    global processing, BASE_FOLDER, model, processor, EXTENSIONS
+    global processing, BASE_FOLDER, model, processor, EXTENSIONS, MODEL_ID
     folder = request.form.get("folder")
     selected_model = request.form.get("model", MODEL_OPTIONS["SigLIP2 Base"])
     if not folder or not os.path.isdir(folder):
         return "Invalid folder path."
     BASE_FOLDER = os.path.abspath(folder)
-    # Load selected model and processor
-    model = AutoModel.from_pretrained(selected_model, device_map="auto", local_files_only=True).eval()
+    MODEL_ID = selected_model
+    # Load selected model and processor in half precision where the
+    # hardware supports it: bf16 on CUDA tensor cores, fp16 on MPS.
+    if torch.cuda.is_available():
+        device, dtype = "cuda", torch.bfloat16
+        torch.backends.cuda.enable_flash_sdp(True)
+        torch.backends.cuda.enable_mem_efficient_sdp(True)
+    elif torch.backends.mps.is_available():
+        device, dtype = "mps", torch.float16
+    else:
+        device, dtype = "cpu", torch.float32
+    model = AutoModel.from_pretrained(selected_model, local_files_only=True).to(device, dtype=dtype).eval()
+    # Compile the method we actually call: wrapping the module only
+    # compiles forward(), which get_image_features never goes through.
+    model.get_image_features = torch.compile(model.get_image_features, mode="reduce-overhead")
     processor = AutoImageProcessor.from_pretrained(selected_model, local_files_only=True)
     # Process additional extensions
     default_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
@@ -150,7 +648,7 @@ def progress():
     global total_images, processed_images, processing, start_time
     pct = int((processed_images / total_images) * 100) if total_images else 0
     time_left = ""
-    if processed_images > 0 and total_images:
+    if processed_images > 0 and total_images and start_time is not None:
         elapsed = time.time() - start_time
         avg = elapsed / processed_images
         remaining = (total_images - processed_images) * avg
@@ -196,21 +694,23 @@ def clusters_route():
         threshold = 0.8
     clusters = compute_clusters(threshold)
     cluster_count = len(clusters)
-    html_content = f"<h3>Number of groups: {cluster_count}</h3>"
+    # Accumulate fragments and join once: += on a growing string copies it
+    # quadratically for galleries with many groups.
+    parts = [f"<h3>Number of groups: {cluster_count}</h3>"]
     if clusters:
         for i, cluster in enumerate(clusters, start=1):
             count = len(cluster)
-            html_content += f"<div style='margin-bottom:20px; padding:10px; border:1px solid #ccc;'>"
-            html_content += f"<p>Group #{i} has {count} elements</p>"
+            parts.append("<div style='margin-bottom:20px; padding:10px; border:1px solid #ccc;'>")
+            parts.append(f"<p>Group #{i} has {count} elements</p>")
             for idx, img in enumerate(cluster):
                 rel_path = os.path.relpath(img, BASE_FOLDER)
-                url = f"/image/{rel_path}"
+                url = f"/thumb/{rel_path}"
                 cls = "selected" if idx == 0 else ""
-                html_content += f"<img src='{url}' data-rel='{rel_path}' title='{rel_path}' class='{cls}' style='height:200px; margin-right:10px; cursor:pointer;' onclick='handleClick(event, this)' ondblclick='handleDblClick(event, this)'/>"
-            html_content += "</div>"
+                parts.append(f"<img src='{url}' data-rel='{rel_path}' title='{rel_path}' class='{cls}' style='height:200px; margin-right:10px; cursor:pointer;' onclick='handleClick(event, this)' ondblclick='handleDblClick(event, this)'/>")
+            parts.append("</div>")
     else:
-        html_content += "<p>No groups found for this threshold.</p>"
-    return html_content
+        parts.append("<p>No groups found for this threshold.</p>")
+    return "".join(parts)
 
 @app.route("/unclustered")
 def unclustered_route():
@@ -224,15 +724,15 @@ def unclustered_route():
         unclustered.sort(key=lambda x: os.path.getctime(x))
     else:
         unclustered.sort(key=lambda x: os.path.basename(x).lower())
-    html_content = f"<h3>Images without a group: {len(unclustered)}</h3>"
+    parts = [f"<h3>Images without a group: {len(unclustered)}</h3>"]
     if unclustered:
         for img in unclustered:
             rel_path = os.path.relpath(img, BASE_FOLDER)
-            url = f"/image/{rel_path}"
-            html_content += f"<img src='{url}' data-rel='{rel_path}' title='{rel_path}' class='selected' style='height:200px; margin-right:10px; cursor:pointer;' onclick='handleClick(event, this)' ondblclick='handleDblClick(event, this)'/>"
+            url = f"/thumb/{rel_path}"
+            parts.append(f"<img src='{url}' data-rel='{rel_path}' title='{rel_path}' class='selected' style='height:200px; margin-right:10px; cursor:pointer;' onclick='handleClick(event, this)' ondblclick='handleDblClick(event, this)'/>")
     else:
-        html_content += "<p>No ungrouped images found.</p>"
-    return html_content
+        parts.append("<p>No ungrouped images found.</p>")
+    return "".join(parts)
 
 @app.route("/")
 def index():
@@ -415,7 +915,8 @@ def index():
             var modal = document.getElementById("imgModal");
             var modalImg = document.getElementById("modalImage");
             modal.style.display = "block";
-            modalImg.src = img.src;
+            // Tiles show thumbnails; the modal loads the full-resolution original.
+            modalImg.src = "/image/" + img.getAttribute("data-rel");
           }
           function closeModal() {
             document.getElementById("imgModal").style.display = "none";